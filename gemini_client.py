@@ -42,21 +42,35 @@ class GeminiClient:
         # Initialize the GenerativeModel. You can choose a specific model.
         # For text generation, 'gemini-2.5-flash' is a good versatile choice.
         # Can be overridden via GEMINI_MODEL environment variable.
-        model_name = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
-        self.model = genai.GenerativeModel(model_name)
+        self.model_name = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+        self.model = genai.GenerativeModel(self.model_name)
+        self._models = {}  # Per-guild model overrides, keyed by name.
         self.chat = None # For conversational history
         self._logger = logging.getLogger(__name__)
 
-    async def generate_response(self, message: discord.Message, previous_msgs: Sequence[discord.Message] = None) -> str:
-        """Generates a response from the Gemini model based on the prompt.
+    def _model_for(self, model_name: str = None):
+        """Returns the model to use, creating and caching overrides on demand.
+
+        Args:
+            model_name (str, optional): Model name; the default model if omitted.
+        """
+        if not model_name or model_name == self.model_name:
+            return self.model
+        if model_name not in self._models:
+            self._models[model_name] = genai.GenerativeModel(model_name)
+        return self._models[model_name]
+
+    def build_prompt(self, message: discord.Message, previous_msgs: Sequence[discord.Message] = None, prompt_basis: str = None) -> str:
+        """Builds the full Gemini prompt for a message and the user's history.
 
         Args:
-            prompt_text (str): The text prompt to send to Gemini.
-            previous_msgs (Sequence[str], optional): Previous messages from the same user.
+            message (discord.Message): The message being responded to.
+            previous_msgs (Sequence[discord.Message], optional): Previous messages from the same user.
+            prompt_basis (str, optional): Persona text; `PROMPT_BASIS` if omitted.
         Returns:
-            str: The generated text response from Gemini, or an error message.
+            str: The prompt text to send to Gemini.
         """
-        prompt = GeminiClient.PROMPT_BASIS
+        prompt = prompt_basis or GeminiClient.PROMPT_BASIS
 
         # Resolve current message content whether we received a discord.Message
         # or a plain string.
@@ -89,15 +103,40 @@ class GeminiClient:
         User's current message:
         {current_content}
         """
+        return prompt
+
+    async def generate_response(self, message: discord.Message, previous_msgs: Sequence[discord.Message] = None, model_name: str = None, prompt_basis: str = None) -> str:
+        """Generates a response from the Gemini model based on the prompt.
+
+        Args:
+            message (discord.Message): The message to respond to.
+            previous_msgs (Sequence[discord.Message], optional): Previous messages from the same user.
+            model_name (str, optional): Model to use instead of the default.
+            prompt_basis (str, optional): Persona text to use instead of `PROMPT_BASIS`.
+        Returns:
+            str: The generated text response from Gemini, or an error message.
+        """
+        prompt = self.build_prompt(message, previous_msgs, prompt_basis)
 
         # Debug: log a truncated preview of the prompt to help troubleshooting.
         self._logger.debug(f"Gemini prompt preview: {prompt[:400].replace('\n','\\n')}... (len={len(prompt)})")
 
+        return await self.generate_from_prompt(prompt, model_name)
+
+    async def generate_from_prompt(self, prompt: str, model_name: str = None) -> str:
+        """Sends an already-built prompt to Gemini and extracts the reply text.
+
+        Args:
+            prompt (str): The full prompt, usually from `build_prompt()`.
+            model_name (str, optional): Model to use instead of the default.
+        Returns:
+            str: The generated text response from Gemini, or an error message.
+        """
         try:
             # For a simple, non-chat generation. Protect with a timeout so the
             # bot doesn't hang indefinitely if the API is slow or unreachable.
             try:
-                response = await asyncio.wait_for(self.model.generate_content_async(prompt), timeout=15)
+                response = await asyncio.wait_for(self._model_for(model_name).generate_content_async(prompt), timeout=15)
             except asyncio.TimeoutError:
                 self._logger.error("Timed out waiting for Gemini response.")
                 return "Sorry, the AI service is taking too long to respond. Try again later."
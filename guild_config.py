@@ -0,0 +1,359 @@
+import asyncio
+import logging
+import threading
+from contextlib import closing
+from typing import Optional, TypedDict
+
+import psycopg2
+from psycopg2 import sql
+
+from chat_history import PSQLParams
+
+
+class GuildSettings(TypedDict):
+    trigger_words: list[str]
+    command_prefix: str
+    model_name: str
+    prompt_basis: str
+
+
+class GuildConfigCache:
+    """An in-memory cache of per-guild and per-channel bot settings.
+
+    Settings live in the `guild_config` table. A row with `channel_id = 0`
+    applies to the whole guild, a row with a channel id overrides it for that
+    channel, and NULL columns inherit from the next level up (channel, guild,
+    then the process defaults). The whole table is loaded at startup and a
+    trigger on the table sends a NOTIFY with the guild id whenever a row
+    changes, so `resolve()` never touches the database.
+
+    Attributes:
+        conn_params (PSQLParams): Database connection parameters.
+        defaults (GuildSettings): Settings used when no row overrides them.
+    """
+
+    TABLE_NAME = "guild_config"
+    TABLE_STRUCT = """
+        guild_id BIGINT NOT NULL,
+        channel_id BIGINT NOT NULL DEFAULT 0,
+        trigger_words TEXT[],
+        command_prefix VARCHAR(10) CHECK (command_prefix IS NULL OR btrim(command_prefix) <> ''),
+        model_name VARCHAR(100),
+        prompt_basis TEXT,
+        PRIMARY KEY (guild_id, channel_id)
+    """
+    NOTIFY_CHANNEL = "guild_config_changed"
+    NOTIFY_FUNCTION = "guild_config_notify"
+    NOTIFY_TRIGGER = "guild_config_notify_trigger"
+    SETTING_COLUMNS = ("trigger_words", "command_prefix", "model_name", "prompt_basis")
+    RECONNECT_DELAY = 5  # seconds
+    CONNECT_TIMEOUT = 10  # seconds
+
+    def __init__(self, db_params: PSQLParams, defaults: GuildSettings) -> None:
+        """Initializes the cache without touching the database.
+
+        Args:
+            db_params (PSQLParams): Database connection parameters.
+            defaults (GuildSettings): Process-wide fallback settings.
+        """
+        self.conn_params: PSQLParams = db_params
+        self.defaults: GuildSettings = defaults
+        self._overrides: dict[int, dict[int, dict]] = {}
+        self._settings: dict[tuple[int, int], GuildSettings] = {}
+        self._lock = threading.Lock()
+        self._listen_conn: Optional[psycopg2.extensions.connection] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._pending_full = False
+        self._pending_guilds: set[int] = set()
+        self._logger = logging.getLogger(__name__)
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        """Opens a new connection with a connect timeout and TCP keepalives so dead peers are noticed."""
+        return psycopg2.connect(
+            **self.conn_params, connect_timeout=GuildConfigCache.CONNECT_TIMEOUT,
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3
+        )
+
+    def _open_listener(self) -> psycopg2.extensions.connection:
+        """Opens an autocommit connection subscribed to change notifications.
+
+        Raises:
+            psycopg2.Error: If connecting or LISTEN fails.
+        """
+        conn = self._connect()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("LISTEN {channel}").format(
+                    channel=sql.Identifier(GuildConfigCache.NOTIFY_CHANNEL)
+                ))
+        except psycopg2.Error:
+            conn.close()
+            raise
+        return conn
+
+    def verify_table(self) -> None:
+        """Creates the config table and its NOTIFY trigger if needed.
+
+        Replicas starting together are serialized with a transaction-level
+        advisory lock, and the trigger function and trigger are only created
+        when missing, so an ordinary boot takes no locks on the table.
+
+        Raises:
+            psycopg2.Error: If the table or trigger creation fails.
+        """
+        table = sql.Identifier(GuildConfigCache.TABLE_NAME)
+        function = sql.Identifier(GuildConfigCache.NOTIFY_FUNCTION)
+        trigger = sql.Identifier(GuildConfigCache.NOTIFY_TRIGGER)
+        create_table = sql.SQL("CREATE TABLE IF NOT EXISTS {table} ({columns})").format(
+            table=table, columns=sql.SQL(GuildConfigCache.TABLE_STRUCT)
+        )
+        create_function = sql.SQL("""
+            CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    PERFORM pg_notify({channel}, OLD.guild_id::text);
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    PERFORM pg_notify({channel}, NEW.guild_id::text);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """).format(function=function, channel=sql.Literal(GuildConfigCache.NOTIFY_CHANNEL))
+        create_trigger = sql.SQL(
+            "CREATE TRIGGER {trigger} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            "FOR EACH ROW EXECUTE FUNCTION {function}()"
+        ).format(trigger=trigger, table=table, function=function)
+
+        with closing(self._connect()) as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (GuildConfigCache.TABLE_NAME,))
+                    cursor.execute(create_table)
+                    cursor.execute(
+                        "SELECT EXISTS (SELECT FROM pg_trigger WHERE tgname = %s AND tgrelid = %s::regclass)",
+                        (GuildConfigCache.NOTIFY_TRIGGER, GuildConfigCache.TABLE_NAME)
+                    )
+                    if not cursor.fetchone()[0]:
+                        cursor.execute(create_function)
+                        cursor.execute(create_trigger)
+                        self._logger.info(f"Created NOTIFY trigger on '{GuildConfigCache.TABLE_NAME}'.")
+                conn.commit()
+                self._logger.info(f"Table '{GuildConfigCache.TABLE_NAME}' created successfully or already exists.")
+            except psycopg2.Error as e:
+                self._logger.warning(f"Error creating table '{GuildConfigCache.TABLE_NAME}': {e}")
+                conn.rollback()
+                raise e
+
+    def _fetch_overrides(self, guild_id: Optional[int] = None) -> dict[int, dict[int, dict]]:
+        """Reads override rows, optionally limited to one guild.
+
+        Returns:
+            dict[int, dict[int, dict]]: Non-NULL, non-blank columns keyed by guild then channel.
+        """
+        columns = sql.SQL(", ").join(
+            sql.Identifier(column) for column in ("guild_id", "channel_id") + GuildConfigCache.SETTING_COLUMNS
+        )
+        query = sql.SQL("SELECT {columns} FROM {table}").format(
+            columns=columns, table=sql.Identifier(GuildConfigCache.TABLE_NAME)
+        )
+        params = ()
+        if guild_id is not None:
+            query = sql.SQL("{query} WHERE guild_id = %s").format(query=query)
+            params = (guild_id,)
+
+        with closing(self._connect()) as conn, conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+        overrides: dict[int, dict[int, dict]] = {}
+        for row in rows:
+            values = {
+                column: value
+                for column, value in zip(GuildConfigCache.SETTING_COLUMNS, row[2:])
+                # Blank strings inherit like NULL; a blank prefix would make
+                # every message a command. Tables created before the CHECK
+                # constraint can still contain them.
+                if value is not None and not (isinstance(value, str) and not value.strip())
+            }
+            if 'trigger_words' in values:
+                # TEXT[] may hold NULL elements; an empty word would match everything.
+                values['trigger_words'] = [word.lower() for word in values['trigger_words'] if word and word.strip()]
+            overrides.setdefault(row[0], {})[row[1]] = values
+        return overrides
+
+    def _merge_guild(self, guild_id: int, channels: dict[int, dict]) -> dict[tuple[int, int], GuildSettings]:
+        """Resolves one guild's rows against the defaults."""
+        guild_settings = GuildSettings(**{**self.defaults, **channels.get(0, {})})
+        merged = {(guild_id, 0): guild_settings}
+        for channel_id, values in channels.items():
+            if channel_id != 0:
+                merged[(guild_id, channel_id)] = GuildSettings(**{**guild_settings, **values})
+        return merged
+
+    def load(self) -> None:
+        """Replaces the whole cache with the current table contents.
+
+        Raises:
+            psycopg2.Error: If the table cannot be read.
+        """
+        overrides = self._fetch_overrides()
+        settings = {}
+        for guild_id, channels in overrides.items():
+            settings.update(self._merge_guild(guild_id, channels))
+        with self._lock:
+            self._overrides = overrides
+            self._settings = settings
+        self._logger.info(f"Loaded configuration for {len(overrides)} guild(s).")
+
+    def reload_guild(self, guild_id: int) -> None:
+        """Refreshes the cached settings of a single guild.
+
+        Args:
+            guild_id (int): The guild whose rows changed.
+
+        Raises:
+            psycopg2.Error: If the table cannot be read.
+        """
+        channels = self._fetch_overrides(guild_id).get(guild_id, {})
+        with self._lock:
+            overrides = dict(self._overrides)
+            settings = {key: value for key, value in self._settings.items() if key[0] != guild_id}
+            if channels:
+                overrides[guild_id] = channels
+                settings.update(self._merge_guild(guild_id, channels))
+            else:
+                overrides.pop(guild_id, None)
+            # Swap in new dicts so readers never see a half-updated cache.
+            self._overrides = overrides
+            self._settings = settings
+        self._logger.info(f"Reloaded configuration for guild {guild_id}.")
+
+    def resolve(self, guild_id: Optional[int], channel_id: Optional[int] = None) -> GuildSettings:
+        """Returns the effective settings for a channel without any DB access.
+
+        Args:
+            guild_id (Optional[int]): The guild id, or None for direct messages.
+            channel_id (Optional[int]): The channel id.
+
+        Returns:
+            GuildSettings: Channel settings, else guild settings, else defaults.
+        """
+        if guild_id is None:
+            return self.defaults
+        settings = self._settings
+        return settings.get((guild_id, channel_id)) or settings.get((guild_id, 0)) or self.defaults
+
+    async def start_listening(self) -> None:
+        """Subscribes to change notifications on the running event loop.
+
+        The connection is opened in a worker thread so an unreachable database
+        cannot stall the Discord gateway. It is then watched with
+        `loop.add_reader()`, and the cache is fully reloaded once subscribed so
+        changes made while not listening are not missed. Failures are logged
+        and retried.
+        """
+        if self._listen_conn is not None:
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            conn = await asyncio.to_thread(self._open_listener)
+        except psycopg2.Error as e:
+            self._logger.error(f"Error listening for configuration changes: {e}")
+            self._schedule(self._reconnect())
+            return
+
+        if self._listen_conn is not None:
+            # Another attempt subscribed while this one was connecting.
+            conn.close()
+            return
+        self._listen_conn = conn
+        loop.add_reader(conn.fileno(), self._on_notify)
+        self._logger.info(f"Listening for configuration changes on '{GuildConfigCache.NOTIFY_CHANNEL}'.")
+        self._request_refresh()
+
+    def stop_listening(self) -> None:
+        """Stops listening and cancels pending reloads."""
+        for task in self._tasks:
+            task.cancel()
+        self._close_listener()
+
+    def _close_listener(self) -> None:
+        if self._listen_conn is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._listen_conn.fileno())
+        except (RuntimeError, ValueError, psycopg2.Error):
+            pass
+        self._listen_conn.close()
+        self._listen_conn = None
+
+    def _on_notify(self) -> None:
+        """Reader callback: drains notifications and schedules guild reloads."""
+        conn = self._listen_conn
+        try:
+            conn.poll()
+        except psycopg2.Error as e:
+            self._logger.warning(f"Lost configuration listener connection: {e}")
+            self._close_listener()
+            self._schedule(self._reconnect())
+            return
+
+        guild_ids = set()
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                guild_ids.add(int(notify.payload))
+            except ValueError:
+                self._logger.warning(f"Ignoring malformed configuration notification: {notify.payload!r}")
+        if guild_ids:
+            self._request_refresh(guild_ids)
+
+    def _schedule(self, coro) -> asyncio.Task:
+        """Runs `coro` as a task, keeping a reference until it finishes."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _request_refresh(self, guild_ids: Optional[set[int]] = None) -> None:
+        """Queues a reload of the given guilds, or of everything if omitted.
+
+        All reloads run one at a time in a single worker task, so a read that
+        started before a change can never overwrite a read made after it. A
+        queued full reload absorbs any guild reloads queued behind it.
+        """
+        if guild_ids is None:
+            self._pending_full = True
+            self._pending_guilds.clear()
+        elif not self._pending_full:
+            self._pending_guilds.update(guild_ids)
+
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = self._schedule(self._refresh_worker())
+
+    async def _refresh_worker(self) -> None:
+        """Drains queued reloads off the event loop until none are left."""
+        while self._pending_full or self._pending_guilds:
+            full, guild_ids = self._pending_full, self._pending_guilds
+            self._pending_full, self._pending_guilds = False, set()
+            try:
+                if full:
+                    await asyncio.to_thread(self.load)
+                else:
+                    for guild_id in sorted(guild_ids):
+                        await asyncio.to_thread(self.reload_guild, guild_id)
+            except Exception as e:
+                # Anything escaping here would kill the worker and drop the
+                # queued change, so every failure falls back to a full reload.
+                self._logger.exception(f"Error reloading configuration, retrying in {GuildConfigCache.RECONNECT_DELAY}s: {e}")
+                self._pending_full = True
+                self._pending_guilds.clear()
+                await asyncio.sleep(GuildConfigCache.RECONNECT_DELAY)
+
+    async def _reconnect(self) -> None:
+        await asyncio.sleep(GuildConfigCache.RECONNECT_DELAY)
+        await self.start_listening()
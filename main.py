@@ -9,6 +9,8 @@ from discord.ext import commands
 
 from chat_history import ChatHelper, PSQLParams
 from gemini_client import GeminiClient
+from guild_config import GuildConfigCache, GuildSettings
+from triggers import TRIGGER_WORDS, contains_trigger_words, is_bot_mentioned
 
 logging.basicConfig(level=logging.INFO)
 
@@ -26,19 +28,6 @@ with ChatHelper(db_connection_params) as chat_helper:
 
 os.environ['PYTHONASYNCIODEBUG'] = '1'  # Enable asyncio debug mode
 COMMAND_PREFIX = "!"
-TRIGGER_WORDS = [
-    word.lower() for word in [
-        "Perl",
-        "Python",
-        "COBAL",
-        "HTML",
-        "CSS",
-        "Unity",
-        "C#",
-        "VSCode",
-        "VS Code"
-    ]
-]
 
 gemini_key = os.getenv('GEMINI_API_KEY')
 if not gemini_key:
@@ -46,11 +35,43 @@ if not gemini_key:
     exit(5)
 ai_client = GeminiClient(api_key=gemini_key)
 
+# Per-guild/channel overrides of the defaults below, kept in memory and
+# refreshed via LISTEN/NOTIFY so on_message never queries for config.
+config_cache = GuildConfigCache(db_connection_params, GuildSettings(
+    trigger_words=TRIGGER_WORDS,
+    command_prefix=COMMAND_PREFIX,
+    model_name=ai_client.model_name,
+    prompt_basis=GeminiClient.PROMPT_BASIS
+))
+config_cache.verify_table()
+config_cache.load()
+
+
+def settings_for(message: discord.Message) -> GuildSettings:
+    """Return the cached settings for the guild/channel of `message`.
+
+    Threads and forum posts use the settings of their parent channel.
+    """
+    guild_id = message.guild.id if message.guild else None
+    channel = message.channel
+    channel_id = channel.parent_id if isinstance(channel, discord.Thread) else channel.id
+    return config_cache.resolve(guild_id, channel_id)
+
+
+def get_prefix(bot: commands.Bot, message: discord.Message) -> str:
+    """Resolve the command prefix for `message` from the config cache."""
+    return settings_for(message)['command_prefix']
+
 intents = discord.Intents.default()
 intents.message_content = True
 
 # client = discord.Client(intents=intents)
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+bot = commands.Bot(command_prefix=get_prefix, intents=intents)
+
+@bot.event
+async def setup_hook():
+    """Runs once before connecting; starts watching for config changes."""
+    await config_cache.start_listening()
 
 @bot.command(name='hello', help='Replies with hello!')
 async def hello(ctx):
@@ -91,43 +112,10 @@ async def on_ready():
     print(f'{bot.user.name} has connected to Discord!')
     print(f'Bot ID: {bot.user.id}')
     print('------')
-    # You can set the bot's presence (status) here
-    await bot.change_presence(activity=discord.Game(name=f"Type {COMMAND_PREFIX}help"))
-
-
-def contains_trigger_words(message_content: str) -> list:
-    """Return a list of trigger words found in the given message content.
-
-    Matching is case-insensitive and returns the list of matched trigger words
-    (lowercased values from `TRIGGER_WORDS`).
-    """
-    if not message_content:
-        return []
-    lowered = message_content.lower()
-    return [word for word in TRIGGER_WORDS if word in lowered]
-
-
-def is_bot_mentioned(message: discord.Message, bot_user: discord.User) -> bool:
-    """Return True if `bot_user` is mentioned in `message`.
-
-    Checks both the parsed `message.mentions` and raw mention tokens
-    (`<@id>` and `<@!id>`) in the message content.
-    """
-    mentioned = False
-    try:
-        if bot_user in message.mentions:
-            return True
-    except Exception:
-        # Defensive: if message.mentions isn't available, continue to token check
-        pass
-
-    # raw mention strings look like '<@123456789>' or '<@!123456789>'
-    mention_token = f"<@{bot_user.id}>"
-    mention_token_alt = f"<@!{bot_user.id}>"
-    if message.content and (mention_token in message.content or mention_token_alt in message.content):
-        mentioned = True
+    # You can set the bot's presence (status) here. Presence is shared by all
+    # guilds, so it must not mention a prefix that guilds can override.
+    await bot.change_presence(activity=discord.Game(name="Judging your code"))
 
-    return mentioned
 
 # If you define your own on_message, you MUST include bot.process_commands(message)
 # for your commands to continue working.
@@ -147,26 +135,12 @@ async def on_message(message):
     with ChatHelper(db_connection_params) as chat_helper:
         chat_helper.save_chat_message(message)
 
-        # Determine if the message is worthy of a response.
-        matched = [word for word in TRIGGER_WORDS if word in message.content.lower()]
-
-        # Also respond when the bot is mentioned. Handle both the parsed
-        # `message.mentions` list (discord.Member/discord.User objects) and the
-        # raw mention tokens that can appear in `message.content`.
-        mentioned = False
-        try:
-            if bot.user in message.mentions:
-                mentioned = True
-        except Exception:
-            # Defensive: if message.mentions isn't available for some reason,
-            # fall back to searching for mention tokens in the content.
-            mentioned = False
-
-        # raw mention strings look like '<@123456789>' or '<@!123456789>'
-        mention_token = f"<@{bot.user.id}>"
-        mention_token_alt = f"<@!{bot.user.id}>"
-        if mention_token in message.content or mention_token_alt in message.content:
-            mentioned = True
+        # Determine if the message is worthy of a response. Also respond when
+        # the bot is mentioned, either via the parsed `message.mentions` list or
+        # a raw mention token in `message.content`.
+        settings = settings_for(message)
+        matched = contains_trigger_words(message.content, settings['trigger_words'])
+        mentioned = is_bot_mentioned(message, bot.user)
 
         if matched or mentioned:
             logging.info(f"Trigger words found: {matched}. Bot mentioned: {mentioned}. Invoking AI client.")
@@ -175,7 +149,8 @@ async def on_message(message):
             # itself returns a user-facing message on failures. Keep try/except
             # minimal and specific when sending the message to Discord.
             ai_response = await ai_client.generate_response(
-                message, chat_helper.messages_from_user(message.author)
+                message, chat_helper.messages_from_user(message.author),
+                model_name=settings['model_name'], prompt_basis=settings['prompt_basis']
             )
             logging.info(f"AI response length: {len(ai_response) if ai_response else 0}")
             if not ai_response:
@@ -0,0 +1,382 @@
+"""Deterministic replay benchmark for the prompt and reply pipeline.
+
+Feeds a recorded stream of messages exported from the `chat_history` table
+through the same steps `on_message()` runs (save, trigger matching, history
+lookup, prompt construction and reply generation) with the database and the
+Gemini model call replaced by in-memory stand-ins. Per-stage timings, prompt
+sizes and tracemalloc allocation figures are written as JSON so runs can be
+compared against a saved baseline.
+
+Export the history with psql:
+
+    \\copy (SELECT id, timestamp, username, channel, message FROM chat_history ORDER BY id) TO 'history.csv' CSV HEADER
+
+Then replay it:
+
+    python replay_benchmark.py history.csv --output baseline.json
+    python replay_benchmark.py history.csv --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Optional, TypedDict
+
+from psycopg2 import sql
+
+from chat_history import ChatHelper, PSQLParams
+from gemini_client import GeminiClient
+from triggers import TRIGGER_WORDS, contains_trigger_words
+
+STAGES = ("save", "trigger", "history", "prompt", "generate")
+
+
+class ReplayRow(TypedDict):
+    id: int
+    timestamp: datetime
+    username: int
+    channel: str
+    message: str
+
+
+def load_history_export(path: str) -> list[ReplayRow]:
+    """Loads a CSV export of the chat history table.
+
+    Args:
+        path (str): Path to a CSV file with a header row containing at least
+            `timestamp`, `username`, `channel` and `message` columns.
+
+    Returns:
+        list[ReplayRow]: The rows ordered by `id` (or file order if absent).
+    """
+    rows = []
+    with open(path, newline='', encoding='utf-8') as export:
+        for index, record in enumerate(csv.DictReader(export)):
+            rows.append(ReplayRow(
+                id=int(record.get('id') or index),
+                timestamp=datetime.fromisoformat(record['timestamp']),
+                username=int(record['username']),
+                channel=record['channel'],
+                message=record['message'],
+            ))
+    rows.sort(key=lambda row: row['id'])
+    return rows
+
+
+def _statement_text(query) -> str:
+    """Returns the literal SQL fragments of a composed query."""
+    if isinstance(query, sql.Composed):
+        return "".join(_statement_text(part) for part in query.seq)
+    if isinstance(query, sql.SQL):
+        return query.string
+    return ""
+
+
+class ReplayConnection:
+    """Stand-in for a psycopg2 connection; transactions are no-ops."""
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ReplayCursor:
+    """In-memory stand-in for the psycopg2 cursor used by `ChatHelper`.
+
+    Understands the INSERT issued by `save_chat_message()` and the SELECT
+    issued by `messages_from_user()`, keeping rows indexed per user so a
+    lookup costs about what `fetchall()` on the real table would.
+
+    Attributes:
+        now (datetime): Replay clock used for `since` filtering.
+    """
+
+    def __init__(self) -> None:
+        self.now: datetime = datetime.min
+        self._rows_by_user: dict[int, list[tuple]] = {}
+        self._result: list[tuple] = []
+
+    def execute(self, query, params: tuple = ()) -> None:
+        statement = _statement_text(query).lstrip().upper()
+        if statement.startswith("INSERT"):
+            username, channel, message = params
+            self._rows_by_user.setdefault(username, []).append(
+                (username, channel, message, self.now)
+            )
+            self._result = []
+        elif statement.startswith("SELECT"):
+            rows = self._rows_by_user.get(params[0], [])
+            if len(params) > 1:
+                cutoff = self.now - timedelta(seconds=params[1])
+                rows = [row for row in rows if row[3] >= cutoff]
+            self._result = list(rows)
+        else:
+            raise NotImplementedError(f"Replay cursor cannot execute: {statement[:40]}")
+
+    def fetchall(self) -> list[tuple]:
+        return self._result
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._result[0] if self._result else None
+
+    def close(self) -> None:
+        pass
+
+
+class StubModel:
+    """Stand-in for `genai.GenerativeModel` that answers instantly."""
+
+    REPLY = "Replay stub response."
+
+    async def generate_content_async(self, prompt: str) -> SimpleNamespace:
+        return SimpleNamespace(parts=[], candidates=[], text=StubModel.REPLY)
+
+
+def _replay_message(row: ReplayRow) -> SimpleNamespace:
+    """Builds a discord.Message-like object from an exported row."""
+    author = SimpleNamespace(id=row['username'], name=str(row['username']), global_name=str(row['username']))
+    return SimpleNamespace(
+        id=row['id'],
+        author=author,
+        channel=SimpleNamespace(name=row['channel']),
+        content=row['message'],
+        clean_content=row['message'],
+        created_at=row['timestamp'],
+        mentions=[],
+    )
+
+
+def _new_chat_helper() -> tuple[ChatHelper, ReplayCursor]:
+    """Returns a `ChatHelper` wired to a fresh in-memory cursor."""
+    chat_helper = ChatHelper(PSQLParams(dbname="replay", user="replay", password="", host="", port=0))
+    cursor = ReplayCursor()
+    chat_helper.conn = ReplayConnection()
+    chat_helper.cursor = cursor
+    return chat_helper, cursor
+
+
+class _Recorder:
+    """Collects per-stage samples for one replay pass."""
+
+    def __init__(self, trace_allocations: bool) -> None:
+        self.trace_allocations = trace_allocations
+        self.timings_ns: dict[str, list[int]] = {stage: [] for stage in STAGES}
+        self.alloc_peak: dict[str, list[int]] = {stage: [] for stage in STAGES}
+        self.alloc_net: dict[str, list[int]] = {stage: [] for stage in STAGES}
+        self.alloc_blocks: dict[str, list[int]] = {stage: [] for stage in STAGES}
+
+    def start(self) -> tuple:
+        if not self.trace_allocations:
+            return (time.perf_counter_ns(),)
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        # getallocatedblocks() is O(1), unlike a tracemalloc snapshot.
+        return (time.perf_counter_ns(), current, sys.getallocatedblocks())
+
+    def stop(self, stage: str, started: tuple) -> None:
+        if not self.trace_allocations:
+            self.timings_ns[stage].append(time.perf_counter_ns() - started[0])
+            return
+        blocks = sys.getallocatedblocks()
+        current, peak = tracemalloc.get_traced_memory()
+        self.alloc_peak[stage].append(peak - started[1])
+        self.alloc_net[stage].append(current - started[1])
+        self.alloc_blocks[stage].append(blocks - started[2])
+
+
+async def replay(rows: list[ReplayRow], ai_client: GeminiClient, recorder: _Recorder, respond_all: bool = False) -> dict:
+    """Replays `rows` once through the message pipeline.
+
+    Args:
+        rows (list[ReplayRow]): The recorded message stream.
+        ai_client (GeminiClient): Client whose model has been stubbed.
+        recorder (_Recorder): Collects stage samples.
+        respond_all (bool): Build a reply for every message instead of only
+            those containing trigger words.
+
+    Returns:
+        dict: Prompt and history size samples plus the number of replies.
+    """
+    chat_helper, cursor = _new_chat_helper()
+    prompt_chars = []
+    history_messages = []
+
+    for row in rows:
+        message = _replay_message(row)
+        cursor.now = row['timestamp']
+
+        started = recorder.start()
+        chat_helper.save_chat_message(message)
+        recorder.stop("save", started)
+
+        started = recorder.start()
+        matched = contains_trigger_words(message.content)
+        recorder.stop("trigger", started)
+
+        if not (matched or respond_all):
+            continue
+
+        started = recorder.start()
+        previous_msgs = chat_helper.messages_from_user(message.author)
+        recorder.stop("history", started)
+
+        started = recorder.start()
+        prompt = ai_client.build_prompt(message, previous_msgs)
+        recorder.stop("prompt", started)
+
+        started = recorder.start()
+        await ai_client.generate_from_prompt(prompt)
+        recorder.stop("generate", started)
+
+        prompt_chars.append(len(prompt))
+        history_messages.append(len(previous_msgs))
+
+    return {'prompt_chars': prompt_chars, 'history_messages': history_messages}
+
+
+def _percentile(samples: list, fraction: float):
+    """Nearest-rank percentile of `samples`."""
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summarize(samples: list) -> dict:
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples) if samples else 0,
+        'p50': _percentile(samples, 0.50),
+        'p95': _percentile(samples, 0.95),
+        'max': max(samples) if samples else 0,
+    }
+
+
+def run_benchmark(rows: list[ReplayRow], repeat: int = 1, trace_allocations: bool = True, respond_all: bool = False) -> dict:
+    """Runs the timing passes and an optional allocation pass.
+
+    Timings come from passes without tracemalloc so tracing overhead does
+    not skew them; allocation figures come from a separate traced pass.
+
+    Args:
+        rows (list[ReplayRow]): The recorded message stream.
+        repeat (int): Number of timed passes over the stream.
+        trace_allocations (bool): Whether to run the tracemalloc pass.
+        respond_all (bool): Build a reply for every message.
+
+    Returns:
+        dict: A JSON-serializable benchmark result.
+    """
+    ai_client = GeminiClient(api_key="replay")
+    ai_client.model = StubModel()
+
+    timing = _Recorder(trace_allocations=False)
+    sizes = {}
+    for _ in range(repeat):
+        sizes = asyncio.run(replay(rows, ai_client, timing, respond_all))
+
+    allocations = None
+    if trace_allocations:
+        allocations = _Recorder(trace_allocations=True)
+        tracemalloc.start()
+        try:
+            asyncio.run(replay(rows, ai_client, allocations, respond_all))
+        finally:
+            tracemalloc.stop()
+
+    stages = {}
+    for stage in STAGES:
+        durations_us = [ns / 1000 for ns in timing.timings_ns[stage]]
+        stages[stage] = {'time_us': _summarize(durations_us)}
+        if allocations:
+            stages[stage]['alloc_peak_bytes'] = _summarize(allocations.alloc_peak[stage])
+            stages[stage]['alloc_net_bytes'] = _summarize(allocations.alloc_net[stage])
+            stages[stage]['alloc_net_blocks'] = _summarize(allocations.alloc_blocks[stage])
+
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'messages': len(rows),
+            'repeat': repeat,
+            'respond_all': respond_all,
+            'trigger_words': TRIGGER_WORDS,
+        },
+        'replies': len(sizes.get('prompt_chars', [])),
+        'prompt_chars': _summarize(sizes.get('prompt_chars', [])),
+        'history_messages': _summarize(sizes.get('history_messages', [])),
+        'stages': stages,
+    }
+
+
+def _delta(current: float, baseline: float) -> str:
+    if not baseline:
+        return "n/a"
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
+
+
+def compare(result: dict, baseline: dict) -> None:
+    """Prints per-stage changes of `result` relative to `baseline`."""
+    if result['meta']['messages'] != baseline['meta']['messages']:
+        print("WARNING: baseline was recorded from a different message stream.", file=sys.stderr)
+
+    print(f"{'metric':<32}{'baseline':>14}{'current':>14}{'delta':>10}")
+    rows = [('prompt_chars.mean', baseline['prompt_chars']['mean'], result['prompt_chars']['mean'])]
+    for stage in STAGES:
+        for metric in ('time_us', 'alloc_peak_bytes', 'alloc_net_bytes', 'alloc_net_blocks'):
+            if metric not in result['stages'][stage] or metric not in baseline['stages'].get(stage, {}):
+                continue
+            for stat in ('mean', 'p95'):
+                rows.append((
+                    f"{stage}.{metric}.{stat}",
+                    baseline['stages'][stage][metric][stat],
+                    result['stages'][stage][metric][stat],
+                ))
+    for name, before, after in rows:
+        print(f"{name:<32}{before:>14.1f}{after:>14.1f}{_delta(after, before):>10}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('export', help="CSV export of the chat_history table.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed passes over the stream (default: 5).")
+    parser.add_argument('--output', help="Write the JSON result to this file.")
+    parser.add_argument('--baseline', help="Compare against a previously saved JSON result.")
+    parser.add_argument('--no-alloc', action='store_true', help="Skip the tracemalloc pass.")
+    parser.add_argument('--respond-all', action='store_true', help="Build a reply for every message, not only triggered ones.")
+    args = parser.parse_args(argv)
+
+    rows = load_history_export(args.export)
+    result = run_benchmark(rows, repeat=args.repeat, trace_allocations=not args.no_alloc, respond_all=args.respond_all)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+        print(f"Wrote replay results for {len(rows)} messages to {args.output}")
+    elif not args.baseline:
+        print(json.dumps(result, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            compare(result, json.load(baseline_file))
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import asyncio
+import copy
+import threading
+
+import psycopg2
+import pytest
+
+from guild_config import GuildConfigCache, GuildSettings
+
+DEFAULTS = GuildSettings(
+    trigger_words=["python"],
+    command_prefix="!",
+    model_name="default-model",
+    prompt_basis="Default persona."
+)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.params = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=()):
+        self.params = params
+
+    def fetchall(self):
+        if self.params:
+            return [row for row in self.rows if row[0] == self.params[0]]
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+    def close(self):
+        pass
+
+
+def make_cache(db: dict) -> GuildConfigCache:
+    """Returns a cache whose reads come from `db` (guild -> channel -> values)."""
+    cache = GuildConfigCache({}, DEFAULTS)
+
+    def fetch_overrides(guild_id=None):
+        snapshot = copy.deepcopy(db)
+        if guild_id is None:
+            return snapshot
+        return {guild_id: snapshot[guild_id]} if guild_id in snapshot else {}
+
+    cache._fetch_overrides = fetch_overrides
+    return cache
+
+
+def test_fetch_overrides_skips_nulls_and_lowercases_triggers():
+    """NULL columns are left out so they inherit; trigger words are lowercased."""
+    cache = GuildConfigCache({}, DEFAULTS)
+    rows = [
+        (1, 0, ["Rust", "GO"], "?", None, None),
+        (1, 5, None, None, "channel-model", None),
+    ]
+    cache._connect = lambda: FakeConnection(rows)
+
+    assert cache._fetch_overrides() == {
+        1: {0: {'trigger_words': ["rust", "go"], 'command_prefix': "?"}, 5: {'model_name': "channel-model"}}
+    }
+
+
+def test_fetch_overrides_drops_null_and_blank_trigger_words():
+    """NULL or blank array elements are skipped instead of crashing the load."""
+    cache = GuildConfigCache({}, DEFAULTS)
+    cache._connect = lambda: FakeConnection([(1, 0, ["Rust", None, "", "  "], None, None, None)])
+
+    cache.load()
+    assert cache.resolve(1, 0)['trigger_words'] == ["rust"]
+
+
+def test_fetch_overrides_treats_blank_strings_as_null():
+    """A blank prefix, model or persona inherits instead of overriding."""
+    cache = GuildConfigCache({}, DEFAULTS)
+    cache._connect = lambda: FakeConnection([
+        (1, 0, None, "?", None, None),
+        (1, 5, None, "  ", "", "\n"),
+    ])
+
+    cache.load()
+    assert cache.resolve(1, 5) == GuildSettings(**{**DEFAULTS, 'command_prefix': "?"})
+
+
+def test_resolve_inherits_channel_guild_defaults():
+    cache = make_cache({
+        1: {0: {'command_prefix': "?", 'trigger_words': ["rust"]}, 5: {'model_name': "channel-model"}},
+        2: {7: {'prompt_basis': "Channel persona."}},
+    })
+    cache.load()
+
+    assert cache.resolve(1, 5) == GuildSettings(
+        trigger_words=["rust"], command_prefix="?", model_name="channel-model", prompt_basis="Default persona."
+    )
+    # Unknown channel in a configured guild gets the guild settings.
+    assert cache.resolve(1, 9)['command_prefix'] == "?"
+    assert cache.resolve(1, 9)['model_name'] == "default-model"
+    # A guild with only a channel row keeps defaults elsewhere.
+    assert cache.resolve(2, 7)['prompt_basis'] == "Channel persona."
+    assert cache.resolve(2, 8) == DEFAULTS
+    # Unknown guilds and direct messages use the defaults.
+    assert cache.resolve(3, 1) == DEFAULTS
+    assert cache.resolve(None, 1) == DEFAULTS
+
+
+def test_empty_trigger_list_overrides_defaults():
+    """An explicit empty list disables triggers rather than inheriting."""
+    cache = make_cache({1: {0: {'trigger_words': []}}})
+    cache.load()
+    assert cache.resolve(1, 0)['trigger_words'] == []
+
+
+def test_reload_guild_replaces_and_removes():
+    db = {
+        1: {0: {'command_prefix': "?"}, 5: {'model_name': "channel-model"}},
+        2: {0: {'command_prefix': "%"}},
+    }
+    cache = make_cache(db)
+    cache.load()
+
+    db[1] = {0: {'command_prefix': "$"}}
+    cache.reload_guild(1)
+    assert cache.resolve(1, 0)['command_prefix'] == "$"
+    # The dropped channel row no longer applies.
+    assert cache.resolve(1, 5)['model_name'] == "default-model"
+    assert cache.resolve(1, 5)['command_prefix'] == "$"
+
+    del db[1]
+    cache.reload_guild(1)
+    assert cache.resolve(1, 0) == DEFAULTS
+    assert cache.resolve(1, 5) == DEFAULTS
+    # Other guilds are untouched.
+    assert cache.resolve(2, 0)['command_prefix'] == "%"
+
+
+@pytest.mark.asyncio
+async def test_guild_reload_after_inflight_full_load_wins():
+    """A guild reload queued during a full load runs after it, not before."""
+    db = {1: {0: {'command_prefix': "?"}}}
+    cache = make_cache(db)
+    fetch = cache._fetch_overrides
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_full_load(guild_id=None):
+        rows = fetch(guild_id)
+        if guild_id is None:
+            started.set()
+            release.wait(5)
+        return rows
+
+    cache._fetch_overrides = slow_full_load
+
+    cache._request_refresh()
+    await asyncio.to_thread(started.wait, 5)
+    db[1][0]['command_prefix'] = "$"
+    cache._request_refresh({1})
+    release.set()
+    await cache._refresh_task
+
+    assert cache.resolve(1, 0)['command_prefix'] == "$"
+
+
+@pytest.mark.asyncio
+async def test_repeated_guild_notifications_apply_in_order():
+    """A second change to the same guild is read after the first reload finishes."""
+    db = {1: {0: {'command_prefix': "?"}}}
+    cache = make_cache(db)
+    fetch = cache._fetch_overrides
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_first_read(guild_id=None):
+        rows = fetch(guild_id)
+        if not started.is_set():
+            started.set()
+            release.wait(5)
+        return rows
+
+    cache._fetch_overrides = slow_first_read
+
+    db[1][0]['command_prefix'] = "#"
+    cache._request_refresh({1})
+    await asyncio.to_thread(started.wait, 5)
+    db[1][0]['command_prefix'] = "$"
+    cache._request_refresh({1})
+    release.set()
+    await cache._refresh_task
+
+    assert cache.resolve(1, 0)['command_prefix'] == "$"
+
+
+@pytest.mark.asyncio
+async def test_pending_full_reload_absorbs_guild_reloads():
+    cache = make_cache({1: {0: {'command_prefix': "?"}}})
+    calls = []
+    fetch = cache._fetch_overrides
+    cache._fetch_overrides = lambda guild_id=None: calls.append(guild_id) or fetch(guild_id)
+
+    cache._request_refresh()
+    cache._request_refresh({1})
+    cache._request_refresh({2})
+    await cache._refresh_task
+
+    assert calls == [None]
+    assert cache.resolve(1, 0)['command_prefix'] == "?"
+
+
+@pytest.mark.asyncio
+async def test_refresh_worker_retries_after_unexpected_error(monkeypatch):
+    """A non-DB error is retried as a full reload instead of dropping the change."""
+    monkeypatch.setattr(GuildConfigCache, 'RECONNECT_DELAY', 0)
+    cache = make_cache({1: {0: {'command_prefix': "$"}}})
+    fetch = cache._fetch_overrides
+    calls = []
+
+    def flaky_fetch(guild_id=None):
+        calls.append(guild_id)
+        if len(calls) == 1:
+            raise AttributeError("boom")
+        return fetch(guild_id)
+
+    cache._fetch_overrides = flaky_fetch
+
+    cache._request_refresh({1})
+    await cache._refresh_task
+
+    assert calls == [1, None]
+    assert cache.resolve(1, 0)['command_prefix'] == "$"
+
+
+def test_open_listener_closes_connection_when_listen_fails():
+    class FailingCursor(FakeCursor):
+        def execute(self, query, params=()):
+            raise psycopg2.OperationalError("listen failed")
+
+    class ListenConnection(FakeConnection):
+        closed = False
+
+        def cursor(self):
+            return FailingCursor(self.rows)
+
+        def close(self):
+            self.closed = True
+
+    conn = ListenConnection([])
+    cache = GuildConfigCache({}, DEFAULTS)
+    cache._connect = lambda: conn
+
+    with pytest.raises(psycopg2.OperationalError):
+        cache._open_listener()
+    assert conn.closed
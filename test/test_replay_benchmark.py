@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+
+import pytest
+from psycopg2 import sql
+
+from replay_benchmark import ReplayCursor, _percentile, compare, load_history_export, run_benchmark
+
+EXPORT = """id,timestamp,username,channel,message
+3,2025-01-02 03:04:07.5+00,200,general,Python again
+1,2025-01-02 03:04:05.123456+00,100,general,I like Python
+2,2025-01-02 03:04:06+00,100,random,hello there
+4,2025-01-02 03:04:08+00,100,general,Perl is fine
+"""
+
+
+@pytest.fixture
+def export_path(tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_text(EXPORT, encoding="utf-8")
+    return str(path)
+
+
+def test_load_history_export_parses_psql_csv(export_path):
+    """Rows are ordered by id and psql timestamps parse with their offset."""
+    rows = load_history_export(export_path)
+    assert [row['id'] for row in rows] == [1, 2, 3, 4]
+    assert rows[0]['timestamp'] == datetime(2025, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc)
+    assert rows[0]['username'] == 100
+    assert rows[0]['message'] == "I like Python"
+
+
+def test_load_history_export_without_id_column(tmp_path):
+    """Without an id column the file order is kept."""
+    path = tmp_path / "history.csv"
+    path.write_text(
+        "timestamp,username,channel,message\n"
+        "2025-01-02 03:04:06+00,1,general,second\n"
+        "2025-01-02 03:04:05+00,2,general,first\n",
+        encoding="utf-8",
+    )
+    rows = load_history_export(str(path))
+    assert [row['message'] for row in rows] == ["second", "first"]
+
+
+def _insert(cursor: ReplayCursor, username: int, message: str, now: datetime) -> None:
+    cursor.now = now
+    cursor.execute(sql.SQL("INSERT INTO {table} (username, channel, message) VALUES (%s, %s, %s)").format(
+        table=sql.Identifier("chat_history")
+    ), (username, "general", message))
+
+
+def test_replay_cursor_insert_and_select():
+    """SELECT returns only the requested user's rows, in insert order."""
+    cursor = ReplayCursor()
+    _insert(cursor, 1, "a", datetime(2025, 1, 1, 0, 0, 0))
+    _insert(cursor, 2, "b", datetime(2025, 1, 1, 0, 0, 1))
+    _insert(cursor, 1, "c", datetime(2025, 1, 1, 0, 0, 2))
+
+    cursor.execute(sql.SQL("SELECT username, channel, message, timestamp FROM chat_history WHERE username = %s"), (1,))
+    assert [row[2] for row in cursor.fetchall()] == ["a", "c"]
+    assert cursor.fetchone()[2] == "a"
+
+
+def test_replay_cursor_select_since():
+    """A second parameter limits rows to the last `since` seconds."""
+    cursor = ReplayCursor()
+    _insert(cursor, 1, "old", datetime(2025, 1, 1, 0, 0, 0))
+    _insert(cursor, 1, "new", datetime(2025, 1, 1, 0, 1, 0))
+
+    cursor.execute(sql.SQL("SELECT username, channel, message, timestamp FROM chat_history"), (1, 30))
+    assert [row[2] for row in cursor.fetchall()] == ["new"]
+
+
+def test_replay_cursor_rejects_other_statements():
+    with pytest.raises(NotImplementedError):
+        ReplayCursor().execute(sql.SQL("DELETE FROM chat_history"))
+
+
+def test_percentile_is_nearest_rank():
+    samples = [5, 1, 4, 2, 3]
+    assert _percentile(samples, 0.50) == 3
+    assert _percentile(samples, 0.95) == 5
+    assert _percentile(samples, 0.20) == 1
+    assert _percentile([], 0.50) == 0
+
+
+def test_run_benchmark_counts_replies_and_history(export_path):
+    """Only triggered messages reply, and history grows with each save."""
+    rows = load_history_export(export_path)
+    result = run_benchmark(rows, repeat=1, trace_allocations=False)
+
+    assert result['meta']['messages'] == 4
+    assert result['replies'] == 3
+    assert result['history_messages']['max'] == 3
+    assert result['history_messages']['mean'] == pytest.approx((1 + 1 + 3) / 3)
+    assert result['stages']['trigger']['time_us']['count'] == 4
+    assert result['stages']['generate']['time_us']['count'] == 3
+    assert 'alloc_peak_bytes' not in result['stages']['prompt']
+
+
+def test_run_benchmark_respond_all(export_path):
+    rows = load_history_export(export_path)
+    result = run_benchmark(rows, repeat=1, trace_allocations=False, respond_all=True)
+    assert result['replies'] == 4
+
+
+def test_run_benchmark_traces_allocations(export_path):
+    """The traced pass reports peak bytes, net bytes and net blocks for every stage."""
+    rows = load_history_export(export_path)
+    result = run_benchmark(rows, repeat=1, trace_allocations=True)
+    for stage in result['stages'].values():
+        assert set(stage) == {'time_us', 'alloc_peak_bytes', 'alloc_net_bytes', 'alloc_net_blocks'}
+    assert result['stages']['history']['alloc_peak_bytes']['count'] == 3
+    assert result['stages']['history']['alloc_net_blocks']['count'] == 3
+
+
+def test_compare_includes_block_counts(export_path, capsys):
+    rows = load_history_export(export_path)
+    result = run_benchmark(rows, repeat=1, trace_allocations=True)
+    compare(result, result)
+    assert "history.alloc_net_blocks.mean" in capsys.readouterr().out
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from triggers import TRIGGER_WORDS, contains_trigger_words, is_bot_mentioned
+
+
+BOT_USER = SimpleNamespace(id=1234)
+
+
+def test_contains_trigger_words_is_case_insensitive():
+    """Matches are found regardless of case and returned lowercased."""
+    assert contains_trigger_words("I write PYTHON and some Perl") == ["perl", "python"]
+
+
+def test_contains_trigger_words_empty_message():
+    """Empty or missing content never matches."""
+    assert contains_trigger_words("") == []
+    assert contains_trigger_words(None) == []
+
+
+def test_contains_trigger_words_custom_list():
+    """A caller-supplied trigger list replaces `TRIGGER_WORDS`."""
+    assert "python" in TRIGGER_WORDS
+    assert contains_trigger_words("Python and Rust", ["rust"]) == ["rust"]
+
+
+def test_is_bot_mentioned_via_mentions():
+    """The parsed mentions list is honoured."""
+    message = SimpleNamespace(mentions=[BOT_USER], content="hey")
+    assert is_bot_mentioned(message, BOT_USER)
+
+
+def test_is_bot_mentioned_via_raw_tokens():
+    """Both `<@id>` and `<@!id>` tokens count as mentions."""
+    for content in ("hi <@1234>", "hi <@!1234>"):
+        assert is_bot_mentioned(SimpleNamespace(mentions=[], content=content), BOT_USER)
+
+
+def test_is_bot_mentioned_without_mentions_attribute():
+    """Messages without a mentions attribute fall back to the token check."""
+    assert not is_bot_mentioned(SimpleNamespace(content="hi <@999>"), BOT_USER)
+    assert is_bot_mentioned(SimpleNamespace(content="hi <@1234>"), BOT_USER)
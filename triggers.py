@@ -0,0 +1,54 @@
+"""Helpers for deciding whether a Discord message deserves a response."""
+
+from typing import Sequence
+
+import discord
+
+TRIGGER_WORDS = [
+    word.lower() for word in [
+        "Perl",
+        "Python",
+        "COBAL",
+        "HTML",
+        "CSS",
+        "Unity",
+        "C#",
+        "VSCode",
+        "VS Code"
+    ]
+]
+
+
+def contains_trigger_words(message_content: str, trigger_words: Sequence[str] = TRIGGER_WORDS) -> list:
+    """Return a list of trigger words found in the given message content.
+
+    Matching is case-insensitive and returns the list of matched trigger words
+    (lowercased values from `trigger_words`, `TRIGGER_WORDS` by default).
+    """
+    if not message_content:
+        return []
+    lowered = message_content.lower()
+    return [word for word in trigger_words if word in lowered]
+
+
+def is_bot_mentioned(message: discord.Message, bot_user: discord.User) -> bool:
+    """Return True if `bot_user` is mentioned in `message`.
+
+    Checks both the parsed `message.mentions` and raw mention tokens
+    (`<@id>` and `<@!id>`) in the message content.
+    """
+    mentioned = False
+    try:
+        if bot_user in message.mentions:
+            return True
+    except Exception:
+        # Defensive: if message.mentions isn't available, continue to token check
+        pass
+
+    # raw mention strings look like '<@123456789>' or '<@!123456789>'
+    mention_token = f"<@{bot_user.id}>"
+    mention_token_alt = f"<@!{bot_user.id}>"
+    if message.content and (mention_token in message.content or mention_token_alt in message.content):
+        mentioned = True
+
+    return mentioned